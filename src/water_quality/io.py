@@ -2,48 +2,94 @@
 Utilities for interacting with local, cloud (S3, GCS), and HTTP filesystems
 """
 
+import asyncio
 import json
 import logging
 import os
 import posixpath
 import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from email.utils import parsedate_to_datetime
+from functools import lru_cache
+from threading import Lock
+from typing import Iterator
 from urllib.parse import urlparse
 
-import fsspec
+import numpy as np
 import pyarrow as pa
 import pyarrow.parquet as pq
 import requests
 import xarray as xr
+from cachetools import TTLCache
+from fsspec.asyn import sync
+from fsspec.implementations.cached import SimpleCacheFileSystem
 from fsspec.implementations.http import HTTPFileSystem
 from fsspec.implementations.local import LocalFileSystem
 from gcsfs import GCSFileSystem
 from odc.aws import s3_url_parse
 from odc.geo.xr import assign_crs
+from requests.adapters import HTTPAdapter
 from s3fs.core import S3FileSystem
 from tqdm import tqdm
+from urllib3.util.retry import Retry
 
 log = logging.getLogger(__name__)
 
 
+def _create_session() -> requests.Session:
+    """Create a requests session whose connection pool is shared
+    across calls so keep-alive connections are reused."""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=50,
+        pool_maxsize=500,
+        max_retries=Retry(total=3, backoff_factor=0.3),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+_SESSION = _create_session()
+
+
+def close_session():
+    """Close the shared requests session and its pooled connections."""
+    _SESSION.close()
+
+
+S3_SCHEMES = ("s3", "s3a")
+GCS_SCHEMES = ("gs", "gcs")
+HTTP_SCHEMES = ("http", "https")
+LOCAL_SCHEMES = ("file", "local")
+
+
+@lru_cache(maxsize=4096)
+def _get_scheme(path: str) -> str:
+    """Get the lower-cased URL scheme of a path, defaulting to "file"
+    for paths without a scheme (including Windows drive letters)."""
+    scheme = urlparse(path).scheme.lower()
+    if len(scheme) <= 1:
+        return "file"
+    return scheme
+
+
 def is_s3_path(path: str) -> bool:
-    fs, _ = fsspec.core.url_to_fs(path)
-    return isinstance(fs, S3FileSystem)
+    return _get_scheme(path) in S3_SCHEMES
 
 
 def is_gcsfs_path(path: str) -> bool:
-    fs, _ = fsspec.core.url_to_fs(path)
-    return isinstance(fs, GCSFileSystem)
+    return _get_scheme(path) in GCS_SCHEMES
 
 
 def is_http_url(path: str) -> bool:
-    fs, _ = fsspec.core.url_to_fs(path)
-    return isinstance(fs, HTTPFileSystem)
+    return _get_scheme(path) in HTTP_SCHEMES
 
 
 def is_local_path(path: str) -> bool:
-    fs, _ = fsspec.core.url_to_fs(path)
-    return isinstance(fs, LocalFileSystem)
+    return _get_scheme(path) in LOCAL_SCHEMES
 
 
 def join_url(base, *paths) -> str:
@@ -57,113 +103,307 @@ def join_url(base, *paths) -> str:
 def get_filesystem(
     path: str,
     anon: bool = True,
-) -> S3FileSystem | LocalFileSystem | GCSFileSystem:
-    if is_s3_path(path=path):
+) -> S3FileSystem | LocalFileSystem | GCSFileSystem | HTTPFileSystem:
+    """Get the filesystem for a path. fsspec caches instances per
+    process and constructor arguments, so repeated calls with the same
+    URL scheme and `anon` reuse the same instance (and its connection
+    pool), while forked workers get their own."""
+    scheme = _get_scheme(path)
+    if scheme in S3_SCHEMES:
         fs = S3FileSystem(
             anon=anon,
             # Use profile only on sandbox
             # profile="default",
             s3_additional_kwargs={"ACL": "bucket-owner-full-control"},
+            # Default botocore pool of 10 connections is quickly
+            # exhausted by parallel reads, writes and listings.
+            config_kwargs={
+                "max_pool_connections": 64,
+                "retries": {"max_attempts": 5, "mode": "adaptive"},
+                "tcp_keepalive": True,
+            },
+            default_block_size=8 * 1024**2,
+            default_cache_type="readahead",
         )
-    elif is_gcsfs_path(path=path):
+    elif scheme in GCS_SCHEMES:
         if anon:
-            fs = GCSFileSystem(token="anon")
+            fs = GCSFileSystem(token="anon", block_size=8 * 1024**2)
         else:
-            fs = GCSFileSystem()
-    elif is_http_url(path):
+            fs = GCSFileSystem(block_size=8 * 1024**2)
+    elif scheme in HTTP_SCHEMES:
         fs = HTTPFileSystem()
-    elif is_local_path(path=path):
+    elif scheme in LOCAL_SCHEMES:
         fs = LocalFileSystem()
+    else:
+        raise NotImplementedError(f"Unsupported filesystem scheme '{scheme}'")
     return fs
 
 
-def check_file_exists(path: str) -> bool:
-    fs = get_filesystem(path=path, anon=True)
-    if fs.exists(path) and fs.isfile(path):
-        return True
+# Cache of path types, including paths that do not exist, so repeated
+# existence checks on the same path do not each make a remote request.
+_PATH_TYPE_CACHE = TTLCache(maxsize=65536, ttl=60)
+_PATH_TYPE_CACHE_LOCK = Lock()
+_MISSING = object()
+
+
+def invalidate_exists(path: str):
+    """Remove a path and all its parent directories from the cache used
+    by `check_file_exists` and `check_directory_exists`. Call this after
+    writing to a path so the new file, and any directories created for
+    it, are not reported as missing."""
+    if is_local_path(path):
+        path_module = os.path
+        sep = os.sep
     else:
-        return False
+        path_module = posixpath
+        sep = "/"
+    with _PATH_TYPE_CACHE_LOCK:
+        _PATH_TYPE_CACHE.pop(path, None)
+        current_path = path.rstrip(sep)
+        while current_path:
+            _PATH_TYPE_CACHE.pop(current_path, None)
+            parent_dir = path_module.dirname(current_path)
+            if parent_dir == current_path:
+                break
+            current_path = parent_dir
+
+
+def _get_path_type(path: str) -> str | None:
+    """Get the type ("file", "directory", ...) of a path using a
+    single metadata request, or None if the path does not exist.
+    Results are cached for 60 seconds."""
+    with _PATH_TYPE_CACHE_LOCK:
+        path_type = _PATH_TYPE_CACHE.get(path, _MISSING)
+    if path_type is not _MISSING:
+        return path_type
+
+    fs = get_filesystem(path=path, anon=True)
+    try:
+        path_type = fs.info(path).get("type")
+    except FileNotFoundError:
+        path_type = None
+
+    with _PATH_TYPE_CACHE_LOCK:
+        _PATH_TYPE_CACHE[path] = path_type
+    return path_type
+
+
+def check_file_exists(path: str) -> bool:
+    return _get_path_type(path) == "file"
 
 
 def check_directory_exists(path: str) -> bool:
-    fs = get_filesystem(path=path, anon=True)
-    if fs.exists(path) and fs.isdir(path):
-        return True
-    else:
-        return False
+    return _get_path_type(path) == "directory"
 
 
-def check_file_extension(path: str, accepted_file_extensions: list[str]) -> bool:
-    _, file_extension = os.path.splitext(path)
-    if file_extension.lower() in accepted_file_extensions:
-        return True
-    else:
+def check_files_exist(paths: list[str], max_workers: int = 32) -> dict[str, bool]:
+    """Check whether each file in a list of paths exists.
+
+    Paths are grouped by their parent directory so that each unique
+    parent is listed once, instead of issuing one request per path.
+    HTTP URLs, and directories that cannot be listed anonymously,
+    are checked one path at a time, concurrently.
+
+    Parameters
+    ----------
+    paths : list[str]
+        File paths or URLs to check.
+    max_workers : int, optional
+        Maximum number of concurrent requests, by default 32
+
+    Returns
+    -------
+    dict[str, bool]
+        Mapping of each path to whether it exists as a file.
+    """
+    results = {}
+
+    unlisted_paths = []
+    groups = defaultdict(list)
+    for path in paths:
+        if is_http_url(path):
+            unlisted_paths.append(path)
+        else:
+            fs = get_filesystem(path=path, anon=True)
+            parent_dir = fs._parent(path)
+            groups[(fs, parent_dir)].append(path)
+
+    for (fs, parent_dir), group_paths in groups.items():
+        try:
+            # Bypass the filesystem's listings cache, which never expires
+            # and is not updated by writes made through other instances.
+            listing = fs.ls(parent_dir, detail=True, refresh=True)
+        except FileNotFoundError:
+            listing = []
+        except PermissionError:
+            # Public buckets often do not allow listing.
+            unlisted_paths.extend(group_paths)
+            continue
+        existing_files = {
+            fs._strip_protocol(entry["name"])
+            for entry in listing
+            if entry["type"] == "file"
+        }
+        for path in group_paths:
+            results[path] = fs._strip_protocol(path) in existing_files
+
+    if unlisted_paths:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for path, exists in zip(
+                unlisted_paths, executor.map(check_file_exists, unlisted_paths)
+            ):
+                results[path] = exists
+
+    return results
+
+
+def _has_extension(path: str, file_extensions: tuple[str, ...]) -> bool:
+    """Check, ignoring case, if a path ends with one of the given
+    lower-case file extensions. As with `os.path.splitext`, a file
+    name that is only an extension (e.g. ".tif") has no extension."""
+    if not file_extensions:
         return False
+    # Only lower-case as much of the end of the path as the longest
+    # extension needs, instead of the whole path.
+    max_length = max(len(file_extension) for file_extension in file_extensions)
+    path_end = path[-max_length:].lower()
+    for file_extension in file_extensions:
+        if path_end.endswith(file_extension):
+            stem = path[: -len(file_extension)]
+            file_stem = stem.replace("\\", "/").rsplit("/", 1)[-1]
+            return file_stem.strip(".") != ""
+    return False
 
 
-def is_geotiff(path: str) -> bool:
-    accepted_geotiff_extensions = [".tif", ".tiff", ".gtiff"]
-    return check_file_extension(
-        path=path, accepted_file_extensions=accepted_geotiff_extensions
+def check_file_extension(path: str, accepted_file_extensions: list[str]) -> bool:
+    return _has_extension(
+        path,
+        tuple(file_extension.lower() for file_extension in accepted_file_extensions),
     )
 
 
-def find_geotiff_files(directory_path: str, file_name_pattern: str = ".*") -> list[str]:
-    file_name_pattern = re.compile(file_name_pattern)
+GEOTIFF_FILE_EXTENSIONS = (".tif", ".tiff", ".gtiff")
+JSON_FILE_EXTENSIONS = (".json",)
 
-    fs = get_filesystem(path=directory_path, anon=True)
 
-    geotiff_file_paths = []
+def is_geotiff(path: str) -> bool:
+    return _has_extension(path, GEOTIFF_FILE_EXTENSIONS)
+
 
-    for root, dirs, files in fs.walk(directory_path):
+def is_json(path: str) -> bool:
+    return _has_extension(path, JSON_FILE_EXTENSIONS)
+
+
+# Prefixes to add back to the listed file paths, as the cloud
+# filesystems strip the protocol when listing.
+_FIND_FILES_PREFIXES = {"s3": "s3://", "s3a": "s3://", "gs": "gs://", "gcs": "gs://"}
+
+
+async def _ls_many(fs, paths: list[str], max_concurrency: int) -> list[list[dict]]:
+    """List multiple directories concurrently."""
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _ls(path: str) -> list[dict]:
+        async with semaphore:
+            try:
+                return await fs._ls(path, detail=True)
+            except FileNotFoundError:
+                # Missing or empty prefixes, or directories removed
+                # during the walk, have nothing to list.
+                return []
+
+    return await asyncio.gather(*[_ls(path) for path in paths])
+
+
+def _walk_concurrent(fs, path: str, max_concurrency: int = 32) -> Iterator[str]:
+    """Yield all the files under a path on an async filesystem.
+    Each level of subdirectories is listed concurrently on the
+    filesystem's event loop, and its files are yielded before
+    the next level is listed."""
+    dirs = [fs._strip_protocol(path).rstrip("/")]
+    while dirs:
+        listings = sync(fs.loop, _ls_many, fs, dirs, max_concurrency)
+        sub_dirs = []
+        for parent_dir, entries in zip(dirs, listings):
+            for entry in entries:
+                if entry["type"] == "file":
+                    yield entry["name"]
+                elif (
+                    entry["type"] == "directory"
+                    and entry["name"].rstrip("/") != parent_dir
+                ):
+                    sub_dirs.append(entry["name"])
+        dirs = sub_dirs
+
+
+def _walk_lazy(fs, path: str) -> Iterator[str]:
+    """Yield all the files under a path as fs.walk lists them."""
+    for root, dirs, files in fs.walk(path):
         for file_name in files:
-            if is_geotiff(path=file_name):
-                if re.search(file_name_pattern, file_name):
-                    geotiff_file_paths.append(os.path.join(root, file_name))
-                else:
-                    continue
-            else:
-                continue
+            yield posixpath.join(root, file_name)
+
+
+def _iter_files(
+    directory_path: str,
+    file_extensions: tuple[str, ...],
+    file_name_pattern: str = ".*",
+) -> Iterator[str]:
+    """Yield the files in a directory, and its subdirectories, that have
+    one of the given file extensions and whose file name matches
+    the given regular expression pattern."""
+    if file_name_pattern == ".*":
+        # Every file name matches the default pattern, skip the regex.
+        def file_name_search(file_name: str) -> bool:
+            return True
 
-    if is_s3_path(path=directory_path):
-        geotiff_file_paths = [f"s3://{file}" for file in geotiff_file_paths]
-    elif is_gcsfs_path(path=directory_path):
-        geotiff_file_paths = [f"gs://{file}" for file in geotiff_file_paths]
-    return geotiff_file_paths
+    else:
+        file_name_search = re.compile(file_name_pattern).search
 
+    fs = get_filesystem(path=directory_path, anon=True)
 
-def is_json(path: str) -> bool:
-    accepted_json_extensions = [".json"]
-    return check_file_extension(
-        path=path, accepted_file_extensions=accepted_json_extensions
+    prefix = _FIND_FILES_PREFIXES.get(_get_scheme(directory_path), "")
+
+    if is_s3_path(directory_path) or is_gcsfs_path(directory_path):
+        all_file_paths = _walk_concurrent(fs, directory_path, max_concurrency=32)
+    else:
+        all_file_paths = _walk_lazy(fs, directory_path)
+
+    for file_path in all_file_paths:
+        if _has_extension(file_path, file_extensions) and file_name_search(
+            posixpath.basename(file_path)
+        ):
+            yield prefix + file_path
+
+
+def iter_geotiff_files(
+    directory_path: str, file_name_pattern: str = ".*"
+) -> Iterator[str]:
+    return _iter_files(
+        directory_path=directory_path,
+        file_extensions=GEOTIFF_FILE_EXTENSIONS,
+        file_name_pattern=file_name_pattern,
     )
 
 
-def find_json_files(directory_path: str, file_name_pattern: str = ".*") -> list[str]:
-    file_name_pattern = re.compile(file_name_pattern)
+def find_geotiff_files(directory_path: str, file_name_pattern: str = ".*") -> list[str]:
+    return list(iter_geotiff_files(directory_path, file_name_pattern))
 
-    fs = get_filesystem(path=directory_path, anon=True)
 
-    json_file_paths = []
+def iter_json_files(
+    directory_path: str, file_name_pattern: str = ".*"
+) -> Iterator[str]:
+    return _iter_files(
+        directory_path=directory_path,
+        file_extensions=JSON_FILE_EXTENSIONS,
+        file_name_pattern=file_name_pattern,
+    )
 
-    for root, dirs, files in fs.walk(directory_path):
-        for file_name in files:
-            if is_json(path=file_name):
-                if re.search(file_name_pattern, file_name):
-                    json_file_paths.append(os.path.join(root, file_name))
-                else:
-                    continue
-            else:
-                continue
 
-    if is_s3_path(path=directory_path):
-        json_file_paths = [f"s3://{file}" for file in json_file_paths]
-    elif is_gcsfs_path(path=directory_path):
-        json_file_paths = [f"gs://{file}" for file in json_file_paths]
-    return json_file_paths
+def find_json_files(directory_path: str, file_name_pattern: str = ".*") -> list[str]:
+    return list(iter_json_files(directory_path, file_name_pattern))
 
 
-def download_file_from_url(url: str, output_file_path: str, chunks: int = 100) -> str:
+def download_file_from_url(url: str, output_file_path: str, chunks: int = 1) -> str:
     """Download a file from a URL
 
     Parameters
@@ -173,7 +413,7 @@ def download_file_from_url(url: str, output_file_path: str, chunks: int = 100) -
     output_file_path : str
         File path to download to.
     chunks : int, optional
-        Chunk size in MB, by default 100
+        Size in MB of each read from the response stream, by default 1
 
     Returns
     -------
@@ -184,13 +424,16 @@ def download_file_from_url(url: str, output_file_path: str, chunks: int = 100) -
 
     # Create the parent directories if they do not exist
     parent_dir = fs._parent(output_file_path)
-    if not check_directory_exists(parent_dir):
-        fs.makedirs(parent_dir, exist_ok=True)
+    fs.makedirs(parent_dir, exist_ok=True)
 
-    with requests.get(url, stream=True) as r:
+    chunk_size = chunks * 1024**2
+    with _SESSION.get(url, stream=True) as r:
         r.raise_for_status()
+        # Decompress any gzip/deflate transfer-encoding while reading the raw stream.
+        r.raw.decode_content = True
         total = int(r.headers.get("content-length", 0))
-        with fs.open(output_file_path, "wb") as f:
+        # block_size sets the multipart upload part size for S3/GCS outputs.
+        with fs.open(output_file_path, "wb", block_size=8 * 1024**2) as f:
             with tqdm(
                 desc=output_file_path,
                 total=total,
@@ -198,45 +441,88 @@ def download_file_from_url(url: str, output_file_path: str, chunks: int = 100) -
                 unit_scale=True,
                 unit_divisor=1024,
             ) as bar:
-                for chunk in r.iter_content(chunk_size=chunks * 1024**2):
-                    size = f.write(chunk)
-                    bar.update(size)
-
+                while True:
+                    chunk = r.raw.read(chunk_size)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    # Count the bytes read off the wire, which is what
+                    # content-length measures for encoded responses.
+                    bar.update(r.raw.tell() - bar.n)
+
+    invalidate_exists(output_file_path)
     return output_file_path
 
 
+# GDAL virtual file system prefixes keyed by URL scheme.
+_GDAL_VSI_NETWORK_PREFIXES = {
+    "file": "",
+    "local": "",
+    "http": "/vsicurl/",
+    "https": "/vsicurl/",
+    "s3": "/vsis3/",
+    "s3a": "/vsis3/",
+    "gs": "/vsigs/",
+    "gcs": "/vsigs/",
+}
+# GDAL virtual file system prefixes keyed by archive file extension.
+_GDAL_VSI_ARCHIVE_PREFIXES = {
+    ".zip": "/vsizip/",
+    ".gz": "/vsigzip/",
+    ".tar": "/vsitar/",
+    ".tgz": "/vsitar/",
+    ".7z": "/vsi7z/",
+    ".rar": "/vsirar/",
+}
+
+
 def get_gdal_vsi_prefix(file_path) -> str:
-    # Based on file extension
-    _, file_extension = os.path.splitext(file_path)
-    if file_extension in [".zip"]:
-        vsi_prefix_1 = "vsizip"
-    elif file_extension in [".gz"]:
-        vsi_prefix_1 = "vsigzip"
-    elif file_extension in [".tar", ".tgz"]:
-        vsi_prefix_1 = "vsitar"
-    elif file_extension in [".7z"]:
-        vsi_prefix_1 = "vsi7z"
-    elif file_extension in [".rar"]:
-        vsi_prefix_1 = "vsirar"
-    else:
-        vsi_prefix_1 = ""
+    """Get the path to a file in GDAL's virtual file system format.
+    Opening remote files is much faster inside `gdal_vsi_env`."""
+    scheme = _get_scheme(file_path)
+    if scheme not in _GDAL_VSI_NETWORK_PREFIXES:
+        raise NotImplementedError(
+            f"No GDAL virtual file system available for '{file_path}'"
+        )
+    network_prefix = _GDAL_VSI_NETWORK_PREFIXES[scheme]
 
-    if vsi_prefix_1:
-        vsi_prefix_1_file_path = f"/{vsi_prefix_1}/{file_path}"
-    else:
-        vsi_prefix_1_file_path = file_path
-
-    # Network based
-    if is_local_path(file_path):
-        return vsi_prefix_1_file_path
-    elif is_http_url(file_path):
-        return f"/vsicurl/{vsi_prefix_1_file_path}"
-    elif is_s3_path(file_path):
-        return f"/vsis3/{vsi_prefix_1_file_path}"
-    elif is_gcsfs_path(file_path):
-        return f"/vsigs/{vsi_prefix_1_file_path}"
-    else:
-        NotImplementedError()
+    _, file_extension = os.path.splitext(file_path)
+    archive_prefix = _GDAL_VSI_ARCHIVE_PREFIXES.get(file_extension, "")
+
+    return f"{network_prefix}{archive_prefix}{file_path}"
+
+
+GDAL_VSI_CONFIG_OPTIONS = {
+    # Avoid listing the parent directory to look for sidecar files
+    # (.ovr, .aux.xml) each time a remote file is opened.
+    "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+    # Only allow the files that get_gdal_vsi_prefix is used for.
+    "CPL_VSIL_CURL_ALLOWED_EXTENSIONS": ",".join(
+        GEOTIFF_FILE_EXTENSIONS + tuple(_GDAL_VSI_ARCHIVE_PREFIXES)
+    ),
+    "VSI_CACHE": "TRUE",
+    "VSI_CACHE_SIZE": str(128 * 1024**2),
+    "GDAL_HTTP_MULTIPLEX": "YES",
+    "GDAL_HTTP_VERSION": "2",
+}
+
+
+@contextmanager
+def gdal_vsi_env():
+    """Context manager that sets the GDAL configuration options in
+    GDAL_VSI_CONFIG_OPTIONS as environment variables, restoring the
+    previous values on exit. Wrap rasterio/GDAL opens of the paths
+    returned by `get_gdal_vsi_prefix` in it."""
+    old_values = {key: os.environ.get(key) for key in GDAL_VSI_CONFIG_OPTIONS}
+    os.environ.update(GDAL_VSI_CONFIG_OPTIONS)
+    try:
+        yield
+    finally:
+        for key, value in old_values.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
 
 
 def gsutil_uri_to_public_url(uri: str) -> str:
@@ -269,7 +555,7 @@ def get_last_modified(uri: str, aws_region="af-south-1"):
 
     assert is_http_url(url)
 
-    response = requests.head(url, allow_redirects=True)
+    response = _SESSION.head(url, allow_redirects=True)
     last_modified = response.headers.get("Last-Modified")
     if last_modified:
         return parsedate_to_datetime(last_modified)
@@ -277,33 +563,188 @@ def get_last_modified(uri: str, aws_region="af-south-1"):
         return None
 
 
-def write_xr_to_parquet(ds: xr.Dataset | xr.DataArray, output_file_path: str):
-    df = ds.to_dataframe().drop(columns="spatial_ref")
-    table = pa.Table.from_pandas(df)
-    existing_meta = table.schema.metadata
+def get_last_modified_many(
+    uris: list[str], aws_region="af-south-1", max_workers: int = 32
+) -> dict:
+    """Returns the Last-Modified timestamp of each URL or URI
+    in a list, if available.
 
-    if ds.attrs:
-        attrs = ds.attrs
-        attrs_json = json.dumps(attrs)
-        key = "xr_attrs"
-        combined_meta = {
-            key.encode(): attrs_json.encode(),
-            **existing_meta,
-        }
-        table = table.replace_schema_metadata(combined_meta)
-    else:
+    S3 URIs are grouped by their parent prefix and each prefix is
+    listed once, as the listing already includes the Last-Modified
+    timestamp of every object. Prefixes that cannot be listed
+    anonymously, and all other URIs, are requested concurrently
+    using HEAD requests.
+    """
+    results = {}
+
+    other_uris = []
+    s3_groups = defaultdict(list)
+    if any(is_s3_path(uri) for uri in uris):
+        fs = get_filesystem(path="s3://", anon=True)
+    for uri in uris:
+        if is_s3_path(uri):
+            s3_groups[fs._parent(uri)].append(uri)
+        else:
+            other_uris.append(uri)
+
+    if s3_groups:
+        for parent_dir, group_uris in s3_groups.items():
+            try:
+                # Bypass the filesystem's listings cache so the
+                # timestamps are always current.
+                listing = fs.ls(parent_dir, detail=True, refresh=True)
+            except FileNotFoundError:
+                listing = []
+            except PermissionError:
+                # Public buckets often do not allow listing.
+                other_uris.extend(group_uris)
+                continue
+            last_modified = {
+                entry["name"]: entry.get("LastModified") for entry in listing
+            }
+            for uri in group_uris:
+                results[uri] = last_modified.get(fs._strip_protocol(uri))
+
+    if other_uris:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for uri, last_modified in zip(
+                other_uris,
+                executor.map(
+                    lambda uri: get_last_modified(uri, aws_region), other_uris
+                ),
+            ):
+                results[uri] = last_modified
+
+    return results
+
+
+def write_xr_to_parquet(
+    ds: xr.Dataset | xr.DataArray,
+    output_file_path: str,
+    compression: str = "ZSTD",
+    compression_level: int | None = None,
+):
+    if isinstance(ds, xr.DataArray):
+        ds = ds.to_dataset(promote_attrs=True)
+
+    if not ds.attrs:
         raise ValueError("Dataset is missing CRS and grid mapping info in attributes")
-    pq.write_table(table, output_file_path, compression="GZIP")
-
 
-def load_parquet_to_xr(pq_file_path: str):
-    table = pq.read_table(pq_file_path)
-    df = table.to_pandas()
-    ds = df.to_xarray()
-
-    custom_meta_key = "xr_attrs"
-    meta_json = table.schema.metadata[custom_meta_key.encode()]
-    meta = json.loads(meta_json)
+    # Build the table directly from the flattened arrays instead of
+    # going through ds.to_dataframe(), which materialises a multi-indexed
+    # copy of the whole dataset.
+    dims = list(ds.sizes)
+    shape = tuple(ds.sizes.values())
+    columns = {}
+    coords_meta = {}
+    for dim in dims:
+        if dim in ds.indexes:
+            coord_values = ds.indexes[dim].values
+        else:
+            coord_values = np.arange(ds.sizes[dim])
+        # Datetimes are not JSON serialisable, store them as ISO strings.
+        if coord_values.dtype.kind in "mM":
+            json_values = coord_values.astype(str).tolist()
+        else:
+            json_values = coord_values.tolist()
+        coords_meta[dim] = {"dtype": str(coord_values.dtype), "values": json_values}
+        expanded_shape = [1] * len(dims)
+        expanded_shape[dims.index(dim)] = ds.sizes[dim]
+        columns[dim] = pa.array(
+            np.broadcast_to(coord_values.reshape(expanded_shape), shape).ravel()
+        )
+    for name, variable in ds.variables.items():
+        if name in ds.dims or name == "spatial_ref":
+            continue
+        values = variable.set_dims(ds.sizes).transpose(*dims).values
+        columns[name] = pa.array(values.reshape(-1))
+    table = pa.Table.from_pydict(columns)
+
+    combined_meta = {
+        b"xr_attrs": json.dumps(ds.attrs).encode(),
+        b"xr_shape": json.dumps(list(ds.sizes.items())).encode(),
+        b"xr_coords": json.dumps(coords_meta).encode(),
+    }
+    table = table.replace_schema_metadata(combined_meta)
+
+    # Split the table into row groups of about 64 MB (uncompressed)
+    # instead of a single row group, so large files can be decoded
+    # one row group at a time and in parallel when read.
+    if table.num_rows:
+        row_nbytes = max(1, table.nbytes // table.num_rows)
+        row_group_size = max(1, 64 * 1024**2 // row_nbytes)
+    else:
+        row_group_size = None
+    # Fast ZSTD level by default. Other codecs, such as Snappy,
+    # do not support setting a compression level.
+    if (
+        compression_level is None
+        and isinstance(compression, str)
+        and compression.upper() == "ZSTD"
+    ):
+        compression_level = 1
+    pq.write_table(
+        table,
+        output_file_path,
+        row_group_size=row_group_size,
+        compression=compression,
+        compression_level=compression_level,
+        use_dictionary=True,
+        data_page_size=1024**2,
+        write_statistics=True,
+    )
+    invalidate_exists(output_file_path)
+
+
+def load_parquet_to_xr(
+    pq_file_path: str, cache_dir: str | None = None, anon: bool = True
+):
+    fs = get_filesystem(pq_file_path, anon=anon)
+    # Cache remote files in cache_dir so repeated loads of the same
+    # file only download it once.
+    if cache_dir is not None and not is_local_path(pq_file_path):
+        fs = SimpleCacheFileSystem(fs=fs, cache_storage=cache_dir)
+    with fs.open(pq_file_path, "rb") as f:
+        table = pq.read_table(f, use_threads=True)
+
+    schema_meta = table.schema.metadata
+    meta = json.loads(schema_meta[b"xr_attrs"])
+
+    if b"xr_shape" in schema_meta:
+        # The columns were written as the flattened (C order) arrays,
+        # so each column can be reshaped back into its array directly
+        # instead of pivoting a multi-indexed dataframe.
+        sizes = dict(json.loads(schema_meta[b"xr_shape"]))
+        dims = list(sizes)
+        shape = tuple(sizes.values())
+        # The 1-D coordinates are stored in the metadata, as they cannot
+        # be recovered from the columns when any dimension has size 0.
+        coords_meta = json.loads(schema_meta[b"xr_coords"])
+        coords = {
+            dim: np.array(coord_meta["values"], dtype=coord_meta["dtype"])
+            for dim, coord_meta in coords_meta.items()
+        }
+        # Remove each column from the table as it is converted, so its
+        # Arrow buffers are released straight away. Columns with several
+        # chunks (row groups) are copied when converted, so this keeps
+        # the peak memory to the data plus one column.
+        data_vars = {}
+        while table.num_columns:
+            name = table.column_names[0]
+            column = table.column(0)
+            table = table.remove_column(0)
+            if name not in sizes:
+                data_vars[name] = (dims, column.to_numpy().reshape(shape))
+            del column
+        del table
+        ds = xr.Dataset(data_vars, coords=coords)
+    else:
+        # Files written through pandas store the dimensions as
+        # a pandas index. self_destruct releases each column as it is
+        # converted, roughly halving the peak memory.
+        df = table.to_pandas(split_blocks=True, self_destruct=True)
+        del table
+        ds = df.to_xarray()
 
     ds.attrs = meta
 
@@ -30,8 +30,8 @@ def get_tile_index_str_tuple(string_: str) -> tuple[str]:
     x_pattern = re.compile(r"x\d{3}")
     y_pattern = re.compile(r"y\d{3}")
 
-    tile_index_x_str = re.search(x_pattern, string_).group(0)
-    tile_index_y_str = re.search(y_pattern, string_).group(0)
+    tile_index_x_str = x_pattern.search(string_).group(0)
+    tile_index_y_str = y_pattern.search(string_).group(0)
 
     return tile_index_x_str, tile_index_y_str
 
@@ -0,0 +1,452 @@
+import gzip
+import os
+import threading
+from datetime import datetime, timezone
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from types import GeneratorType
+
+import numpy as np
+import pytest
+from fsspec.asyn import get_loop
+
+from water_quality.io import (
+    GDAL_VSI_CONFIG_OPTIONS,
+    check_directory_exists,
+    check_file_exists,
+    check_file_extension,
+    check_files_exist,
+    download_file_from_url,
+    find_geotiff_files,
+    find_json_files,
+    gdal_vsi_env,
+    get_filesystem,
+    get_gdal_vsi_prefix,
+    get_last_modified_many,
+    is_gcsfs_path,
+    is_geotiff,
+    is_http_url,
+    is_json,
+    is_local_path,
+    is_s3_path,
+    iter_geotiff_files,
+    load_parquet_to_xr,
+    write_xr_to_parquet,
+)
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("s3://bucket/key.tif", (True, False, False, False)),
+        ("s3a://bucket/key.tif", (True, False, False, False)),
+        ("gs://bucket/key.tif", (False, True, False, False)),
+        ("gcs://bucket/key.tif", (False, True, False, False)),
+        ("https://example.com/key.tif", (False, False, True, False)),
+        ("http://example.com/key.tif", (False, False, True, False)),
+        ("/tmp/key.tif", (False, False, False, True)),
+        ("file:///tmp/key.tif", (False, False, False, True)),
+        ("tests/data/places.parquet", (False, False, False, True)),
+        ("C:\\data\\key.tif", (False, False, False, True)),
+    ],
+)
+def test_path_type_checks(path, expected):
+    result = (
+        is_s3_path(path),
+        is_gcsfs_path(path),
+        is_http_url(path),
+        is_local_path(path),
+    )
+    assert result == expected
+
+
+def test_get_filesystem_is_cached():
+    fs_1 = get_filesystem("s3://bucket/a.tif", anon=True)
+    fs_2 = get_filesystem("s3://other-bucket/b.tif", anon=True)
+    assert fs_1 is fs_2
+
+
+def test_check_files_exist_local(tmp_path):
+    existing_file = tmp_path / "a.tif"
+    existing_file.write_bytes(b"")
+    sub_dir = tmp_path / "sub"
+    sub_dir.mkdir()
+
+    paths = [
+        str(existing_file),
+        str(tmp_path / "b.tif"),
+        str(sub_dir),
+        str(tmp_path / "missing" / "c.tif"),
+    ]
+    expected_results = {
+        str(existing_file): True,
+        str(tmp_path / "b.tif"): False,
+        str(sub_dir): False,
+        str(tmp_path / "missing" / "c.tif"): False,
+    }
+    assert check_files_exist(paths) == expected_results
+
+
+def test_find_files_local(tmp_path):
+    sub_dir = tmp_path / "x010" / "y020"
+    sub_dir.mkdir(parents=True)
+    for file_name in ["a_x010y020.tif", "b_x010y020.TIFF", "c.json", "d.txt"]:
+        (sub_dir / file_name).write_bytes(b"")
+    (tmp_path / "e_x011y020.tif").write_bytes(b"")
+
+    expected_geotiffs = sorted(
+        [
+            str(sub_dir / "a_x010y020.tif"),
+            str(sub_dir / "b_x010y020.TIFF"),
+            str(tmp_path / "e_x011y020.tif"),
+        ]
+    )
+    assert sorted(find_geotiff_files(str(tmp_path))) == expected_geotiffs
+    assert find_geotiff_files(str(tmp_path), file_name_pattern=r"x011") == [
+        str(tmp_path / "e_x011y020.tif")
+    ]
+    assert find_json_files(str(tmp_path)) == [str(sub_dir / "c.json")]
+
+    geotiff_files = iter_geotiff_files(str(tmp_path))
+    assert isinstance(geotiff_files, GeneratorType)
+    assert sorted(geotiff_files) == expected_geotiffs
+
+
+@pytest.mark.parametrize("shape", [(2, 3, 4), (0, 3, 4)])
+@pytest.mark.parametrize("as_dataarray", [False, True])
+@pytest.mark.parametrize("descending_y", [False, True])
+def test_parquet_round_trip(
+    tmp_path, random_xr_dataset, descending_y, as_dataarray, shape
+):
+    var_names = ["var_1", "var_2"]
+    ds = random_xr_dataset(var_names=var_names, shape=shape, seed=42)
+    if descending_y:
+        ds = ds.isel(y=slice(None, None, -1))
+    output_file_path = str(tmp_path / "test.parquet")
+
+    if as_dataarray:
+        var_names = ["var_1"]
+        write_xr_to_parquet(ds["var_1"].assign_attrs(ds.attrs), output_file_path)
+    else:
+        write_xr_to_parquet(ds, output_file_path)
+    loaded_ds = load_parquet_to_xr(output_file_path)
+
+    assert loaded_ds.attrs == ds.attrs
+    assert "spatial_ref" in loaded_ds.coords
+    assert sorted(loaded_ds.data_vars) == var_names
+    assert dict(loaded_ds.sizes) == dict(ds.sizes)
+    for dim in ["time", "y", "x"]:
+        np.testing.assert_array_equal(loaded_ds[dim].values, ds[dim].values)
+    for var in var_names:
+        assert loaded_ds[var].dims == ds[var].dims
+        np.testing.assert_allclose(loaded_ds[var].values, ds[var].values)
+
+
+def test_write_xr_to_parquet_missing_attrs(tmp_path, random_xr_dataset):
+    ds = random_xr_dataset(var_names=["var_1"], shape=(1, 2, 3))
+    ds.attrs = {}
+    with pytest.raises(ValueError):
+        write_xr_to_parquet(ds, str(tmp_path / "test.parquet"))
+
+
+@pytest.mark.parametrize(
+    "file_path, expected",
+    [
+        ("/tmp/key.tif", "/tmp/key.tif"),
+        ("/tmp/key.zip", "/vsizip//tmp/key.zip"),
+        ("https://example.com/key.tif", "/vsicurl/https://example.com/key.tif"),
+        ("https://example.com/key.gz", "/vsicurl//vsigzip/https://example.com/key.gz"),
+        ("s3://bucket/key.tgz", "/vsis3//vsitar/s3://bucket/key.tgz"),
+        ("gs://bucket/key.7z", "/vsigs//vsi7z/gs://bucket/key.7z"),
+    ],
+)
+def test_get_gdal_vsi_prefix(file_path, expected):
+    assert get_gdal_vsi_prefix(file_path) == expected
+
+
+def test_get_gdal_vsi_prefix_unsupported_scheme():
+    with pytest.raises(NotImplementedError):
+        get_gdal_vsi_prefix("ftp://example.com/key.tif")
+
+
+def test_gdal_vsi_env_restores_environment(monkeypatch):
+    monkeypatch.setenv("VSI_CACHE", "FALSE")
+    monkeypatch.delenv("GDAL_DISABLE_READDIR_ON_OPEN", raising=False)
+
+    with gdal_vsi_env():
+        for key, value in GDAL_VSI_CONFIG_OPTIONS.items():
+            assert os.environ[key] == value
+        allowed_extensions = os.environ["CPL_VSIL_CURL_ALLOWED_EXTENSIONS"].split(",")
+        for file_extension in [".tif", ".tiff", ".gtiff", ".zip", ".gz", ".tgz"]:
+            assert file_extension in allowed_extensions
+
+    assert os.environ["VSI_CACHE"] == "FALSE"
+    assert "GDAL_DISABLE_READDIR_ON_OPEN" not in os.environ
+
+
+def test_check_file_exists_after_write(tmp_path, random_xr_dataset):
+    output_file_path = str(tmp_path / "test.parquet")
+    assert not check_file_exists(output_file_path)
+
+    ds = random_xr_dataset(var_names=["var_1"], shape=(1, 2, 3))
+    write_xr_to_parquet(ds, output_file_path)
+    assert check_file_exists(output_file_path)
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("s3://bucket/prefix/key.tif", (True, False)),
+        ("s3://bucket/prefix/key.TIFF", (True, False)),
+        ("/tmp/key.gtiff", (True, False)),
+        ("/tmp/key.tif.json", (False, True)),
+        ("https://example.com/key.JSON", (False, True)),
+        ("/tmp/key.nc", (False, False)),
+        ("/tmp/.tif", (False, False)),
+        ("s3://bucket/prefix/.json", (False, False)),
+        ("C:\\data\\.tif", (False, False)),
+        ("/tmp/a..tif", (True, False)),
+    ],
+)
+def test_is_geotiff_is_json(path, expected):
+    assert (is_geotiff(path), is_json(path)) == expected
+
+
+class MockS3FileSystem:
+    def __init__(self, listings: dict, error: type[Exception] | None = None):
+        self.listings = listings
+        self.error = error
+        self.ls_calls = []
+
+    def _strip_protocol(self, path):
+        return path.removeprefix("s3://").rstrip("/")
+
+    def _parent(self, path):
+        return self._strip_protocol(path).rsplit("/", 1)[0]
+
+    def ls(self, path, detail=False, refresh=False):
+        self.ls_calls.append((path, refresh))
+        if self.error is not None:
+            raise self.error(path)
+        return self.listings[path]
+
+
+def test_check_files_exist_falls_back_to_head(monkeypatch):
+    fs = MockS3FileSystem({}, error=PermissionError)
+    monkeypatch.setattr("water_quality.io.get_filesystem", lambda *a, **k: fs)
+    existing_paths = {"s3://bucket/prefix/a.tif", "https://example.com/c.tif"}
+    head_calls = []
+
+    def mock_check_file_exists(path):
+        head_calls.append(path)
+        return path in existing_paths
+
+    monkeypatch.setattr("water_quality.io.check_file_exists", mock_check_file_exists)
+
+    paths = [
+        "s3://bucket/prefix/a.tif",
+        "s3://bucket/prefix/b.tif",
+        "https://example.com/c.tif",
+    ]
+    results = check_files_exist(paths)
+
+    assert results == {path: path in existing_paths for path in paths}
+    assert sorted(head_calls) == sorted(paths)
+    assert fs.ls_calls == [("bucket/prefix", True)]
+
+
+def test_get_last_modified_many_s3_listing(monkeypatch):
+    last_modified = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    listing = [{"name": "bucket/prefix/a.tif", "LastModified": last_modified}]
+    fs = MockS3FileSystem({"bucket/prefix": listing})
+    monkeypatch.setattr("water_quality.io.get_filesystem", lambda *a, **k: fs)
+
+    results = get_last_modified_many(
+        ["s3://bucket/prefix/a.tif", "s3://bucket/prefix/b.tif"]
+    )
+
+    assert results == {
+        "s3://bucket/prefix/a.tif": last_modified,
+        "s3://bucket/prefix/b.tif": None,
+    }
+    assert fs.ls_calls == [("bucket/prefix", True)]
+
+
+def test_get_last_modified_many_falls_back_to_head(monkeypatch):
+    last_modified = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    fs = MockS3FileSystem({}, error=PermissionError)
+    monkeypatch.setattr("water_quality.io.get_filesystem", lambda *a, **k: fs)
+    head_calls = []
+
+    def mock_get_last_modified(uri, aws_region):
+        head_calls.append((uri, aws_region))
+        return last_modified
+
+    monkeypatch.setattr("water_quality.io.get_last_modified", mock_get_last_modified)
+
+    uris = ["s3://bucket/prefix/a.tif", "https://example.com/b.tif"]
+    results = get_last_modified_many(uris, aws_region="us-west-2")
+
+    assert results == {uri: last_modified for uri in uris}
+    assert sorted(head_calls) == sorted((uri, "us-west-2") for uri in uris)
+
+
+@pytest.mark.parametrize(
+    "compression", ["ZSTD", "SNAPPY", "GZIP", None, {"var_1": "ZSTD", "x": "SNAPPY"}]
+)
+def test_write_xr_to_parquet_compression(tmp_path, random_xr_dataset, compression):
+    ds = random_xr_dataset(var_names=["var_1"], shape=(1, 2, 3), seed=42)
+    output_file_path = str(tmp_path / "test.parquet")
+
+    write_xr_to_parquet(ds, output_file_path, compression=compression)
+    loaded_ds = load_parquet_to_xr(output_file_path)
+
+    np.testing.assert_allclose(loaded_ds["var_1"].values, ds["var_1"].values)
+
+
+class GzipEncodingRequestHandler(SimpleHTTPRequestHandler):
+    """Serves ".gz" files as gzip-encoded responses."""
+
+    def end_headers(self):
+        if self.path.endswith(".gz"):
+            self.send_header("Content-Encoding", "gzip")
+        super().end_headers()
+
+
+@pytest.fixture
+def http_server(tmp_path):
+    serve_dir = tmp_path / "served"
+    serve_dir.mkdir()
+    handler = partial(GzipEncodingRequestHandler, directory=str(serve_dir))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield serve_dir, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_load_parquet_to_xr_cache_dir(tmp_path, http_server, random_xr_dataset):
+    serve_dir, base_url = http_server
+    ds = random_xr_dataset(var_names=["var_1"], shape=(1, 2, 3), seed=42)
+    write_xr_to_parquet(ds, str(serve_dir / "test.parquet"))
+    cache_dir = tmp_path / "cache"
+
+    url = f"{base_url}/test.parquet"
+    loaded_ds = load_parquet_to_xr(url, cache_dir=str(cache_dir))
+    np.testing.assert_allclose(loaded_ds["var_1"].values, ds["var_1"].values)
+    assert len(os.listdir(cache_dir)) > 0
+
+    # The second load is served from the cache.
+    (serve_dir / "test.parquet").unlink()
+    loaded_ds = load_parquet_to_xr(url, cache_dir=str(cache_dir))
+    np.testing.assert_allclose(loaded_ds["var_1"].values, ds["var_1"].values)
+
+
+def test_check_directory_exists_after_write(tmp_path, random_xr_dataset):
+    parent_dir = tmp_path / "a" / "b"
+    output_file_path = str(parent_dir / "test.parquet")
+    assert not check_directory_exists(str(tmp_path / "a"))
+    assert not check_directory_exists(str(parent_dir))
+
+    parent_dir.mkdir(parents=True)
+    ds = random_xr_dataset(var_names=["var_1"], shape=(1, 2, 3))
+    write_xr_to_parquet(ds, output_file_path)
+    assert check_directory_exists(str(tmp_path / "a"))
+    assert check_directory_exists(str(parent_dir))
+
+
+class MockAsyncFileSystem:
+    def __init__(self, listings: dict):
+        self.listings = listings
+        self.loop = get_loop()
+
+    def _strip_protocol(self, path):
+        return path.removeprefix("s3://").rstrip("/")
+
+    async def _ls(self, path, detail=False):
+        if path not in self.listings:
+            raise FileNotFoundError(path)
+        return self.listings[path]
+
+
+def test_find_geotiff_files_s3_concurrent_walk(monkeypatch):
+    fs = MockAsyncFileSystem(
+        {
+            "bucket/prefix": [
+                {"name": "bucket/prefix/a.tif", "type": "file"},
+                {"name": "bucket/prefix/b.json", "type": "file"},
+                {"name": "bucket/prefix/sub", "type": "directory"},
+                # Removed during the walk, so listing it fails.
+                {"name": "bucket/prefix/removed", "type": "directory"},
+            ],
+            "bucket/prefix/sub": [
+                {"name": "bucket/prefix/sub/c.TIF", "type": "file"},
+            ],
+        }
+    )
+    monkeypatch.setattr("water_quality.io.get_filesystem", lambda *a, **k: fs)
+
+    assert sorted(find_geotiff_files("s3://bucket/prefix")) == [
+        "s3://bucket/prefix/a.tif",
+        "s3://bucket/prefix/sub/c.TIF",
+    ]
+    assert find_json_files("s3://bucket/prefix") == ["s3://bucket/prefix/b.json"]
+
+
+def test_find_geotiff_files_s3_missing_prefix(monkeypatch):
+    fs = MockAsyncFileSystem({})
+    monkeypatch.setattr("water_quality.io.get_filesystem", lambda *a, **k: fs)
+
+    assert find_geotiff_files("s3://bucket/missing") == []
+
+
+@pytest.mark.parametrize("content_encoded", [False, True])
+def test_download_file_from_url(tmp_path, http_server, content_encoded):
+    serve_dir, base_url = http_server
+    content = os.urandom(1024) * 3000
+    if content_encoded:
+        file_name = "test.bin.gz"
+        (serve_dir / file_name).write_bytes(gzip.compress(content))
+    else:
+        file_name = "test.bin"
+        (serve_dir / file_name).write_bytes(content)
+
+    output_file_path = str(tmp_path / "downloads" / "a" / "b" / "test.bin")
+    assert not check_file_exists(output_file_path)
+
+    result = download_file_from_url(f"{base_url}/{file_name}", output_file_path)
+
+    assert result == output_file_path
+    assert check_file_exists(output_file_path)
+    with open(output_file_path, "rb") as f:
+        assert f.read() == content
+
+
+def test_load_parquet_to_xr_anon(tmp_path, monkeypatch, random_xr_dataset):
+    ds = random_xr_dataset(var_names=["var_1"], shape=(1, 2, 3), seed=42)
+    output_file_path = str(tmp_path / "test.parquet")
+    write_xr_to_parquet(ds, output_file_path)
+    get_filesystem_calls = []
+
+    def mock_get_filesystem(path, anon=True):
+        get_filesystem_calls.append((path, anon))
+        return get_filesystem(path, anon=anon)
+
+    monkeypatch.setattr("water_quality.io.get_filesystem", mock_get_filesystem)
+
+    load_parquet_to_xr(output_file_path, anon=False)
+    assert get_filesystem_calls == [(output_file_path, False)]
+
+
+@pytest.mark.parametrize(
+    "path, expected",
+    [
+        ("/tmp/key.NC", True),
+        ("/tmp/key.nc4", True),
+        ("/tmp/key.tif", False),
+        ("/tmp/.nc", False),
+    ],
+)
+def test_check_file_extension(path, expected):
+    assert check_file_extension(path, [".nc", ".NC4"]) == expected